@@ -1,261 +1,391 @@
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import plotly.io as pio
 import numpy as np
-from flask import Blueprint, jsonify, send_file
+import orjson
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import singledispatch
+import hashlib
 import io
-import json
+import xlsxwriter
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.lineplots import LinePlot
-from reportlab.graphics.charts.piecharts import Pie
-from reportlab.graphics import renderPDF
 
-from models import Recommendation, Material
+from cache import cache
+from database import db
+from models import Recommendation, Material, Product
 
 analytics_bp = Blueprint("analytics", __name__)
 
 
-# ================= JSON SAFE CONVERTER ================= #
-def make_json_safe(obj):
-    """Convert numpy/pandas objects to JSON-serializable types"""
-    if isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [make_json_safe(v) for v in obj]
-    if isinstance(obj, np.ndarray):
-        return obj.tolist()
-    if isinstance(obj, (np.bool_, bool)):
-        return bool(obj)
-    if isinstance(obj, (np.floating, float)):
-        if pd.isna(obj):
-            return None
-        return float(obj)
-    if isinstance(obj, (np.integer, int)):
-        return int(obj)
-    if isinstance(obj, (datetime,)):
-        return obj.isoformat()
-    return obj
+# ================= QUERY HELPERS ================= #
+def recommendation_rows_query(user_id, *columns):
+    """SELECT of the given columns over a user's recommendations joined with material and product"""
+    return (
+        select(*columns)
+        .select_from(Recommendation)
+        .outerjoin(Material, Recommendation.material_id == Material.id)
+        .outerjoin(Product, Recommendation.product_id == Product.id)
+        .where(Recommendation.user_id == user_id)
+        .order_by(Recommendation.id)
+    )
+
+
+def fetch_recommendation_rows(user_id, *columns):
+    """Fetch the given columns for a user's recommendations in a single SELECT"""
+    return db.session.execute(recommendation_rows_query(user_id, *columns)).all()
+
+
+# ================= JSON SERIALIZATION ================= #
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+@singledispatch
+def orjson_default(obj):
+    """Fallback for values orjson can't encode natively; dispatched on type(obj)"""
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+@orjson_default.register(np.ndarray)
+def _(obj):
+    # Object-dtype arrays (e.g. category labels) and non-contiguous views
+    return obj.tolist()
+
+
+@orjson_default.register(np.generic)
+def _(obj):
+    # Numpy scalars orjson has no native encoder for (e.g. datetime64)
+    return obj.item()
+
+
+def dumps_json(obj):
+    """Serialize numpy/pandas-backed payloads straight to JSON bytes"""
+    return orjson.dumps(obj, default=orjson_default, option=ORJSON_OPTIONS)
 
 
 # ================= DASHBOARD DATA ================= #
+EMPTY_DASHBOARD = {
+    "metrics": {
+        "total_recommendations": 0,
+        "avg_co2_reduction": 0.0,
+        "avg_cost_savings": 0.0,
+        "avg_eco_score": 0.0,
+        "top_material": "None",
+        "total_co2_saved": 0.0,
+        "total_cost_saved": 0.0
+    },
+    "charts": {}
+}
+
+
+def dashboard_etag(user_id):
+    """Cheap fingerprint of a user's recommendations, changes whenever rows are added or removed"""
+    count, last_created = db.session.execute(
+        select(func.count(Recommendation.id), func.max(Recommendation.created_at))
+        .where(Recommendation.user_id == user_id)
+    ).one()
+    return hashlib.md5(f"{user_id}:{count}:{last_created}".encode()).hexdigest()
+
+
 @analytics_bp.route("/dashboard", methods=["GET"])
 @jwt_required()
 def dashboard():
     try:
         user_id = int(get_jwt_identity())
         
-        # Get user's recommendations
-        recs = Recommendation.query.filter_by(user_id=user_id).all()
-        
-        if not recs:
-            # Return empty structure for new users
-            return jsonify({
-                "metrics": {
-                    "total_recommendations": 0,
-                    "avg_co2_reduction": 0.0,
-                    "avg_cost_savings": 0.0,
-                    "avg_eco_score": 0.0,
-                    "top_material": "None",
-                    "total_co2_saved": 0.0,
-                    "total_cost_saved": 0.0
-                },
-                "charts": {}
-            }), 200
-        
-        # Prepare data
-        data = []
-        for rec in recs:
-            if rec.material:
-                data.append({
-                    "material": rec.material.material_name,
-                    "co2": float(rec.co2_reduction_percent or 0),
-                    "cost": float(rec.cost_savings_percent or 0),
-                    "score": float(rec.recommendation_score or 0),
-                    "date": rec.created_at
-                })
-        
-        if not data:
-            return jsonify({
-                "metrics": {
-                    "total_recommendations": 0,
-                    "avg_co2_reduction": 0.0,
-                    "avg_cost_savings": 0.0,
-                    "avg_eco_score": 0.0,
-                    "top_material": "None",
-                    "total_co2_saved": 0.0,
-                    "total_cost_saved": 0.0
-                },
-                "charts": {}
-            }), 200
-        
-        df = pd.DataFrame(data)
-        
-        # Calculate metrics
-        total_recs = len(df)
-        avg_co2 = round(df["co2"].mean(), 1)
-        avg_cost = round(df["cost"].mean(), 1)
-        avg_score = round(df["score"].mean(), 2)
-        
-        # Find top material
-        material_counts = df["material"].value_counts()
-        top_material = material_counts.index[0] if not material_counts.empty else "None"
-        
-        # Calculate totals (assuming each recommendation saves CO2/cost)
-        total_co2_saved = round(df["co2"].sum() / 100 * total_recs, 1)  # Simplified calculation
-        total_cost_saved = round(df["cost"].sum() / 100 * total_recs * 100, 1)  # Assuming $100 per product
-        
-        metrics = {
-            "total_recommendations": total_recs,
-            "avg_co2_reduction": avg_co2,
-            "avg_cost_savings": avg_cost,
-            "avg_eco_score": avg_score,
-            "top_material": top_material,
-            "total_co2_saved": total_co2_saved,
-            "total_cost_saved": total_cost_saved
-        }
-        
-        # Create charts
-        charts = create_charts(df)
-        
-        # Get recent recommendations for activity list
-        recent_recs = []
-        for rec in recs[-5:]: # Last 5
-            recent_recs.append({
-                "id": rec.id,
-                "product": rec.product.product_name if rec.product else "Unknown",
-                "material": rec.material.material_name if rec.material else "Unknown",
-                "score": float(rec.recommendation_score or 0),
-                "date": rec.created_at.isoformat()
-            })
-        recent_recs.reverse() # Newest first
-
-        return jsonify({
-            "metrics": metrics,
-            "charts": make_json_safe(charts),
-            "recent_recommendations": recent_recs
-        }), 200
+        etag = dashboard_etag(user_id)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        
+        response = Response(build_dashboard(user_id, etag), mimetype="application/json")
+        response.set_etag(etag)
+        return response, 200
         
     except Exception as e:
         print(f"❌ Dashboard error: {str(e)}")
         return jsonify({"error": f"Failed to load dashboard: {str(e)}"}), 500
 
 
-def create_charts(df):
-    """Create Plotly charts from dataframe"""
-    display_charts = {}
+@cache.memoize(timeout=300)
+def build_dashboard(user_id, etag):
+    """Build the serialized dashboard payload; memoized per (user, etag) so unchanged data is served from cache"""
+    # Headline metrics are aggregated in the database
+    total_recs, avg_co2, avg_cost, avg_score, sum_co2, sum_cost = db.session.execute(
+        select(
+            func.count(Recommendation.id),
+            func.avg(Recommendation.co2_reduction_percent),
+            func.avg(Recommendation.cost_savings_percent),
+            func.avg(Recommendation.recommendation_score),
+            func.sum(Recommendation.co2_reduction_percent),
+            func.sum(Recommendation.cost_savings_percent)
+        ).where(Recommendation.user_id == user_id)
+    ).one()
+    
+    if not total_recs:
+        # Return empty structure for new users
+        return dumps_json(EMPTY_DASHBOARD)
+    
+    # Find top material
+    top_material = db.session.execute(
+        select(Material.material_name)
+        .join(Recommendation, Recommendation.material_id == Material.id)
+        .where(Recommendation.user_id == user_id)
+        .group_by(Material.id)
+        .order_by(func.count(Recommendation.id).desc(), Material.material_name)
+        .limit(1)
+    ).scalar() or "None"
+    
+    # Calculate totals (assuming each recommendation saves CO2/cost)
+    total_co2_saved = round((sum_co2 or 0) / 100 * total_recs, 1)  # Simplified calculation
+    total_cost_saved = round((sum_cost or 0) / 100 * total_recs * 100, 1)  # Assuming $100 per product
+    
+    metrics = {
+        "total_recommendations": total_recs,
+        "avg_co2_reduction": round(avg_co2 or 0, 1),
+        "avg_cost_savings": round(avg_cost or 0, 1),
+        "avg_eco_score": round(avg_score or 0, 2),
+        "top_material": top_material,
+        "total_co2_saved": total_co2_saved,
+        "total_cost_saved": total_cost_saved
+    }
+    
+    # Row-level columns are only needed for the charts (no ORM hydration)
+    rows = fetch_recommendation_rows(
+        user_id,
+        Material.material_name,
+        Recommendation.co2_reduction_percent,
+        Recommendation.cost_savings_percent,
+        Recommendation.recommendation_score,
+        Recommendation.created_at
+    )
     
-    # 1. Monthly Trends Chart
+    df = pd.DataFrame.from_records(
+        rows, columns=["material", "co2", "cost", "score", "date"]
+    )
+    df = df[df["material"].notna()]
+    # Naive timestamps are UTC; timestamptz ones arrive in the session zone
+    df["date"] = pd.to_datetime(df["date"], utc=True).dt.tz_localize(None)
+    df[["co2", "cost", "score"]] = df[["co2", "cost", "score"]].astype(float).fillna(0)
+    
+    # Create charts
+    charts = create_charts(df)
+    
+    # Get recent recommendations for activity list (newest first)
+    recent_rows = db.session.execute(
+        recommendation_rows_query(
+            user_id,
+            Recommendation.id,
+            Product.product_name,
+            Material.material_name,
+            Recommendation.recommendation_score,
+            Recommendation.created_at
+        )
+        .order_by(None)
+        .order_by(Recommendation.created_at.desc(), Recommendation.id.desc())
+        .limit(5)
+    ).all()
+    recent_recs = [{
+        "id": rec.id,
+        "product": rec.product_name or "Unknown",
+        "material": rec.material_name or "Unknown",
+        "score": float(rec.recommendation_score or 0),
+        "date": rec.created_at.isoformat()
+    } for rec in recent_rows]
+
+    return dumps_json({
+        "metrics": metrics,
+        "charts": charts,
+        "recent_recommendations": recent_recs
+    })
+
+
+# Plotly template resolved once at import; charts below are plain figure dicts
+PLOTLY_WHITE = pio.templates["plotly_white"].to_plotly_json()
+CHART_MARGIN = {"l": 50, "r": 20, "t": 20, "b": 50}
+
+
+def monthly_means(months, *columns):
+    """Per-month means of each column: sort once by month, then sum contiguous runs with np.add.reduceat"""
+    order = months.argsort(kind="stable")
+    uniq, starts = np.unique(months[order], return_index=True)
+    if not len(uniq):
+        return uniq, [np.empty(0) for _ in columns]
+    counts = np.diff(np.append(starts, len(months)))
+    return uniq, [np.add.reduceat(col[order], starts) / counts for col in columns]
+
+
+def build_trend_chart(df):
+    """1. Monthly Trends Chart"""
     try:
-        df["month"] = df["date"].dt.strftime("%Y-%m")
-        monthly_data = df.groupby("month").agg({
-            "co2": "mean",
-            "cost": "mean",
-            "score": "mean"
-        }).reset_index().sort_values("month")
-        
-        if not monthly_data.empty:
-            fig_trend = go.Figure()
-            fig_trend.add_trace(go.Scatter(
-                x=monthly_data["month"], y=monthly_data["co2"],
-                mode="lines+markers", name="CO₂ Reduction",
-                line=dict(color="#10B981", width=3)
-            ))
-            fig_trend.add_trace(go.Scatter(
-                x=monthly_data["month"], y=monthly_data["cost"],
-                mode="lines+markers", name="Cost Savings",
-                line=dict(color="#3B82F6", width=3)
-            ))
-            fig_trend.update_layout(
-                xaxis=dict(title="Month", type="category"),
-                yaxis_title="Percentage (%)",
-                template="plotly_white",
-                margin=dict(l=50, r=20, t=20, b=50),
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-            )
-            display_charts["trend_chart"] = fig_trend.to_dict()
+        # Truncate to month as integer datetime64 keys; only the unique months get formatted
+        months, (co2_means, cost_means) = monthly_means(
+            df["date"].to_numpy().astype("datetime64[M]"),
+            df["co2"].to_numpy(), df["cost"].to_numpy()
+        )
+        months = np.datetime_as_string(months, unit="M")
+        
+        if len(months):
+            return {
+                "data": [
+                    {
+                        "type": "scatter", "mode": "lines+markers", "name": "CO₂ Reduction",
+                        "x": months, "y": co2_means,
+                        "line": {"color": "#10B981", "width": 3}
+                    },
+                    {
+                        "type": "scatter", "mode": "lines+markers", "name": "Cost Savings",
+                        "x": months, "y": cost_means,
+                        "line": {"color": "#3B82F6", "width": 3}
+                    }
+                ],
+                "layout": {
+                    "xaxis": {"title": {"text": "Month"}, "type": "category"},
+                    "yaxis": {"title": {"text": "Percentage (%)"}},
+                    "template": PLOTLY_WHITE,
+                    "margin": CHART_MARGIN,
+                    "legend": {"orientation": "h", "yanchor": "bottom", "y": 1.02, "xanchor": "right", "x": 1}
+                }
+            }
     except Exception as e:
         print(f"⚠️ Trend chart error: {e}")
+    return None
+
 
-    # 2. Material Usage Chart
+def build_material_chart(df):
+    """2. Material Usage Chart"""
     try:
-        m_counts = df["material"].value_counts().head(8).reset_index()
-        m_counts.columns = ["material", "count"]
+        m_counts = df["material"].value_counts().head(8).rename_axis("material").reset_index(name="count")
         if not m_counts.empty:
-            fig_mat = px.bar(
-                m_counts, x="material", y="count",
-                color="count", color_continuous_scale="Viridis"
-            )
-            fig_mat.update_layout(
-                template="plotly_white",
-                xaxis_title="Material",
-                yaxis_title="Count",
-                margin=dict(l=50, r=20, t=20, b=50),
-                coloraxis_showscale=False
-            )
-            display_charts["material_chart"] = fig_mat.to_dict()
+            counts = m_counts["count"].to_numpy()
+            return {
+                "data": [{
+                    "type": "bar",
+                    "x": m_counts["material"].to_numpy(), "y": counts,
+                    "marker": {"color": counts, "colorscale": "Viridis", "showscale": False}
+                }],
+                "layout": {
+                    "template": PLOTLY_WHITE,
+                    "xaxis": {"title": {"text": "Material"}},
+                    "yaxis": {"title": {"text": "Count"}},
+                    "margin": CHART_MARGIN
+                }
+            }
     except Exception as e:
         print(f"⚠️ Material chart error: {e}")
+    return None
+
 
-    # 3. Score Distribution
+def build_score_chart(df):
+    """3. Score Distribution"""
     try:
         if len(df) > 0:
-            fig_hist = px.histogram(
-                df, x="score", nbins=10,
-                color_discrete_sequence=["#10B981"]
-            )
-            fig_hist.update_layout(
-                template="plotly_white",
-                xaxis_title="Eco Score",
-                yaxis_title="Frequency",
-                margin=dict(l=50, r=20, t=20, b=50)
-            )
-            display_charts["score_chart"] = fig_hist.to_dict()
+            # Bin server-side so the figure carries 10 bars instead of every score
+            counts, edges = np.histogram(df["score"].to_numpy(), bins=10)
+            return {
+                "data": [{
+                    "type": "bar",
+                    "x": (edges[:-1] + edges[1:]) / 2, "y": counts,
+                    "width": np.diff(edges),
+                    "marker": {"color": "#10B981"}
+                }],
+                "layout": {
+                    "template": PLOTLY_WHITE,
+                    "xaxis": {"title": {"text": "Eco Score"}},
+                    "yaxis": {"title": {"text": "Frequency"}},
+                    "margin": CHART_MARGIN,
+                    "bargap": 0
+                }
+            }
     except Exception as e:
         print(f"⚠️ Score chart error: {e}")
-    
+    return None
+
+
+CHART_BUILDERS = (
+    ("trend_chart", build_trend_chart),
+    ("material_chart", build_material_chart),
+    ("score_chart", build_score_chart),
+)
+
+# Shared by all requests; threads are only started on first use
+CHART_POOL = ThreadPoolExecutor(max_workers=len(CHART_BUILDERS), thread_name_prefix="charts")
+
+
+def create_charts(df):
+    """Create Plotly figure dicts from dataframe, building the independent charts concurrently"""
+    futures = {name: CHART_POOL.submit(build, df) for name, build in CHART_BUILDERS}
+    display_charts = {}
+    for name, future in futures.items():
+        chart = future.result()
+        if chart is not None:
+            display_charts[name] = chart
     return display_charts
 
 
+# ================= EXPORT FORMATTING ================= #
+CSV_HEADER = ["Material", "CO2 Reduction (%)", "Cost Savings (%)", "Eco Score", "Date", "Product"]
+EXCEL_HEADER = CSV_HEADER + ["Recyclability (%)", "Strength", "Cost per kg"]
+
+
+def export_frame(rows, columns):
+    """Build an export DataFrame from columnar rows, formatting whole columns at once"""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    df[["Material", "Product"]] = df[["Material", "Product"]].fillna("Unknown")
+    df["CO2 Reduction (%)"] = df["CO2 Reduction (%)"].astype(float).fillna(0).round(2)
+    df["Cost Savings (%)"] = df["Cost Savings (%)"].astype(float).fillna(0).round(2)
+    df["Eco Score"] = df["Eco Score"].astype(float).fillna(0).round(3)
+    df["Date"] = pd.to_datetime(df["Date"], utc=True).dt.strftime("%Y-%m-%d %H:%M")
+    extra = [col for col in columns if col not in CSV_HEADER]
+    df[extra] = df[extra].fillna(0)
+    return df
+
+
 # ================= EXPORT CSV ================= #
 @analytics_bp.route("/export/csv", methods=["GET"])
 @jwt_required()
 def export_csv():
     try:
         user_id = int(get_jwt_identity())
-        recs = Recommendation.query.filter_by(user_id=user_id).all()
-        
-        data = []
-        for rec in recs:
-            data.append({
-                "Material": rec.material.material_name if rec.material else "Unknown",
-                "CO2 Reduction (%)": round(rec.co2_reduction_percent or 0, 2),
-                "Cost Savings (%)": round(rec.cost_savings_percent or 0, 2),
-                "Eco Score": round(rec.recommendation_score or 0, 3),
-                "Date": rec.created_at.strftime("%Y-%m-%d %H:%M"),
-                "Product": rec.product.product_name if rec.product else "Unknown"
-            })
-        
-        df = pd.DataFrame(data)
-        
-        buf = io.BytesIO()
-        df.to_csv(buf, index=False, encoding='utf-8')
-        buf.seek(0)
+        stmt = recommendation_rows_query(
+            user_id,
+            Material.material_name,
+            Recommendation.co2_reduction_percent,
+            Recommendation.cost_savings_percent,
+            Recommendation.recommendation_score,
+            Recommendation.created_at,
+            Product.product_name
+        ).execution_options(yield_per=1000)
+        rows = db.session.execute(stmt)
+        
+        def generate():
+            # Runs after the view has returned, so the try/except below can't see
+            # these errors; log them and re-raise so the server aborts the stream
+            # instead of ending it like a complete file
+            written = 0
+            try:
+                yield pd.DataFrame(columns=CSV_HEADER).to_csv(index=False)
+                for chunk in rows.partitions():
+                    yield export_frame(chunk, CSV_HEADER).to_csv(index=False, header=False)
+                    written += len(chunk)
+            except Exception as e:
+                print(f"❌ CSV export for user {user_id} failed after {written} rows: {str(e)}")
+                raise
         
         filename = f"EcoPackAI_Report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
         
-        return send_file(
-            buf,
-            as_attachment=True,
-            download_name=filename,
-            mimetype="text/csv"
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
         
     except Exception as e:
@@ -263,47 +393,60 @@ def export_csv():
 
 
 # ================= EXPORT EXCEL ================= #
+# Same header look pandas' to_excel produces
+EXCEL_HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+
+def write_excel_sheet(workbook, name, df, header_format):
+    """Write a DataFrame strictly row by row, as xlsxwriter's constant_memory mode requires"""
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, df.columns, header_format)
+    for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    return worksheet
+
+
 @analytics_bp.route("/export/excel", methods=["GET"])
 @jwt_required()
 def export_excel():
     try:
         user_id = int(get_jwt_identity())
-        recs = Recommendation.query.filter_by(user_id=user_id).all()
-        
-        data = []
-        for rec in recs:
-            data.append({
-                "Material": rec.material.material_name if rec.material else "Unknown",
-                "CO2 Reduction (%)": round(rec.co2_reduction_percent or 0, 2),
-                "Cost Savings (%)": round(rec.cost_savings_percent or 0, 2),
-                "Eco Score": round(rec.recommendation_score or 0, 3),
-                "Date": rec.created_at.strftime("%Y-%m-%d %H:%M"),
-                "Product": rec.product.product_name if rec.product else "Unknown",
-                "Recyclability (%)": rec.material.recyclability_percent if rec.material else 0,
-                "Strength": rec.material.strength_rating if rec.material else 0,
-                "Cost per kg": rec.material.cost_per_kg if rec.material else 0
-            })
-        
-        df = pd.DataFrame(data)
+        rows = fetch_recommendation_rows(
+            user_id,
+            Material.material_name,
+            Recommendation.co2_reduction_percent,
+            Recommendation.cost_savings_percent,
+            Recommendation.recommendation_score,
+            Recommendation.created_at,
+            Product.product_name,
+            Material.recyclability_percent,
+            Material.strength_rating,
+            Material.cost_per_kg
+        )
         
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Recommendations', index=False)
-            
-            # Add summary sheet
-            if not df.empty:
-                summary = {
-                    "Metric": ["Total Recommendations", "Avg CO2 Reduction", "Avg Cost Savings", "Avg Eco Score"],
-                    "Value": [
-                        len(df),
-                        f"{df['CO2 Reduction (%)'].mean():.1f}%",
-                        f"{df['Cost Savings (%)'].mean():.1f}%",
-                        f"{df['Eco Score'].mean():.3f}"
-                    ]
-                }
-                summary_df = pd.DataFrame(summary)
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
+        df = export_frame(rows, EXCEL_HEADER)
         
+        buf = io.BytesIO()
+        # constant_memory flushes each row as it is written instead of holding the whole sheet
+        workbook = xlsxwriter.Workbook(buf, {"constant_memory": True})
+        header_format = workbook.add_format(EXCEL_HEADER_FORMAT)
+        write_excel_sheet(workbook, 'Recommendations', df, header_format)
+        
+        # Add summary sheet
+        if not df.empty:
+            summary = {
+                "Metric": ["Total Recommendations", "Avg CO2 Reduction", "Avg Cost Savings", "Avg Eco Score"],
+                "Value": [
+                    len(df),
+                    f"{df['CO2 Reduction (%)'].mean():.1f}%",
+                    f"{df['Cost Savings (%)'].mean():.1f}%",
+                    f"{df['Eco Score'].mean():.3f}"
+                ]
+            }
+            summary_df = pd.DataFrame(summary)
+            write_excel_sheet(workbook, 'Summary', summary_df, header_format)
+        
+        workbook.close()
         buf.seek(0)
         
         filename = f"EcoPackAI_Report_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
@@ -320,111 +463,139 @@ def export_excel():
 
 
 # ================= EXPORT PDF ================= #
+# Report styles are built once at import and shared by every export
+PDF_STYLES = getSampleStyleSheet()
+
+PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=PDF_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor("#198754"),
+    spaceAfter=30,
+    alignment=1  # Center
+)
+
+PDF_HEADER_STYLE = ParagraphStyle(
+    'CustomHeader',
+    parent=PDF_STYLES['Heading2'],
+    fontSize=14,
+    textColor=colors.HexColor("#0d6efd"),
+    spaceAfter=10
+)
+
+PDF_NORMAL_STYLE = ParagraphStyle(
+    'CustomNormal',
+    parent=PDF_STYLES['Normal'],
+    fontSize=10,
+    spaceAfter=6
+)
+
+PDF_TABLE_HEADER = ["Material", "CO₂ Reduction", "Cost Savings", "Eco Score", "Date", "Product"]
+PDF_TABLE_COL_WIDTHS = [1.5*inch, 1*inch, 1*inch, 0.8*inch, 1*inch, 1.5*inch]
+
+PDF_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#198754")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+])
+
+
+def utc_dates(values):
+    """
+    created_at values as a UTC DatetimeIndex. timestamptz rows arrive with the
+    session's offset, which can differ across a DST change; naive ones are UTC.
+    """
+    return pd.to_datetime(list(values), utc=True)
+
+
+def pdf_table_rows(rows, created):
+    """Format report table cells column-wise with numpy string ops, then zip into rows"""
+    materials, co2, cost, score, _, products = zip(*rows)
+    columns = [
+        ["Unknown" if m is None else m for m in materials],
+        np.char.mod("%.1f%%", np.nan_to_num(np.array(co2, dtype=np.float64))).tolist(),
+        np.char.mod("%.1f%%", np.nan_to_num(np.array(cost, dtype=np.float64))).tolist(),
+        np.char.mod("%.3f", np.nan_to_num(np.array(score, dtype=np.float64))).tolist(),
+        created.strftime("%Y-%m-%d").tolist(),
+        ["Unknown" if p is None else p for p in products]
+    ]
+    return [list(row) for row in zip(*columns)]
+
+
 @analytics_bp.route("/export/pdf", methods=["GET"])
 @jwt_required()
 def export_pdf():
     try:
         user_id = int(get_jwt_identity())
-        recs = Recommendation.query.filter_by(user_id=user_id).all()
+        rows = fetch_recommendation_rows(
+            user_id,
+            Material.material_name,
+            Recommendation.co2_reduction_percent,
+            Recommendation.cost_savings_percent,
+            Recommendation.recommendation_score,
+            Recommendation.created_at,
+            Product.product_name
+        )
         
-        if not recs:
+        if not rows:
             return jsonify({"error": "No data to export"}), 400
         
         # Create PDF
         buf = io.BytesIO()
         doc = SimpleDocTemplate(buf, pagesize=landscape(A4))
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor("#198754"),
-            spaceAfter=30,
-            alignment=1  # Center
-        )
-        
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor("#0d6efd"),
-            spaceAfter=10
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=6
-        )
         
         # Build document
         elements = []
         
         # Title
-        elements.append(Paragraph("EcoPackAI Sustainability Report", title_style))
-        elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
+        elements.append(Paragraph("EcoPackAI Sustainability Report", PDF_TITLE_STYLE))
+        elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}", PDF_STYLES['Normal']))
         elements.append(Spacer(1, 20))
         
         # Summary
-        elements.append(Paragraph("Executive Summary", header_style))
-        
-        if recs:
-            avg_co2 = sum(r.co2_reduction_percent or 0 for r in recs) / len(recs)
-            avg_cost = sum(r.cost_savings_percent or 0 for r in recs) / len(recs)
-            avg_score = sum(r.recommendation_score or 0 for r in recs) / len(recs)
-            
-            summary_text = f"""
-            Total Recommendations: {len(recs)}<br/>
-            Average CO₂ Reduction: {avg_co2:.1f}%<br/>
-            Average Cost Savings: {avg_cost:.1f}%<br/>
-            Average Eco Score: {avg_score:.3f}<br/>
-            Report Period: {min(r.created_at for r in recs).strftime('%Y-%m-%d')} to {max(r.created_at for r in recs).strftime('%Y-%m-%d')}
-            """
-            elements.append(Paragraph(summary_text, normal_style))
+        elements.append(Paragraph("Executive Summary", PDF_HEADER_STYLE))
+        
+        # Same UTC dates as the CSV/Excel exports
+        created = utc_dates(r.created_at for r in rows)
+        avg_co2 = sum(r.co2_reduction_percent or 0 for r in rows) / len(rows)
+        avg_cost = sum(r.cost_savings_percent or 0 for r in rows) / len(rows)
+        avg_score = sum(r.recommendation_score or 0 for r in rows) / len(rows)
+        
+        summary_text = f"""
+        Total Recommendations: {len(rows)}<br/>
+        Average CO₂ Reduction: {avg_co2:.1f}%<br/>
+        Average Cost Savings: {avg_cost:.1f}%<br/>
+        Average Eco Score: {avg_score:.3f}<br/>
+        Report Period: {created.min().strftime('%Y-%m-%d')} to {created.max().strftime('%Y-%m-%d')}
+        """
+        elements.append(Paragraph(summary_text, PDF_NORMAL_STYLE))
         
         elements.append(Spacer(1, 20))
         
         # Recommendations Table
-        elements.append(Paragraph("Detailed Recommendations", header_style))
-        
-        table_data = [["Material", "CO₂ Reduction", "Cost Savings", "Eco Score", "Date", "Product"]]
-        
-        for rec in recs[:50]:  # Limit to first 50 records
-            table_data.append([
-                rec.material.material_name if rec.material else "Unknown",
-                f"{rec.co2_reduction_percent or 0:.1f}%",
-                f"{rec.cost_savings_percent or 0:.1f}%",
-                f"{rec.recommendation_score or 0:.3f}",
-                rec.created_at.strftime("%Y-%m-%d"),
-                rec.product.product_name if rec.product else "Unknown"
-            ])
-        
-        table = Table(table_data, colWidths=[1.5*inch, 1*inch, 1*inch, 0.8*inch, 1*inch, 1.5*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#198754")),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ]))
+        elements.append(Paragraph("Detailed Recommendations", PDF_HEADER_STYLE))
+        
+        table_data = [PDF_TABLE_HEADER] + pdf_table_rows(rows[:50], created[:50])  # Limit to first 50 records
+        
+        table = Table(table_data, colWidths=PDF_TABLE_COL_WIDTHS)
+        table.setStyle(PDF_TABLE_STYLE)
         
         elements.append(table)
         
-        if len(recs) > 50:
+        if len(rows) > 50:
             elements.append(Spacer(1, 10))
-            elements.append(Paragraph(f"... and {len(recs) - 50} more recommendations", normal_style))
+            elements.append(Paragraph(f"... and {len(rows) - 50} more recommendations", PDF_NORMAL_STYLE))
         
         # Footer
         elements.append(Spacer(1, 30))
-        elements.append(Paragraph("EcoPackAI - Sustainable Packaging Solutions", styles['Italic']))
-        elements.append(Paragraph("Generated with AI-powered recommendations", styles['Italic']))
+        elements.append(Paragraph("EcoPackAI - Sustainable Packaging Solutions", PDF_STYLES['Italic']))
+        elements.append(Paragraph("Generated with AI-powered recommendations", PDF_STYLES['Italic']))
         
         # Build PDF
         doc.build(elements)
@@ -450,51 +621,39 @@ def export_pdf():
 def material_insights():
     try:
         user_id = int(get_jwt_identity())
-        recs = Recommendation.query.filter_by(user_id=user_id).all()
-        
-        if not recs:
-            return jsonify({"insights": []}), 200
-        
-        # Group by material
-        material_stats = {}
-        for rec in recs:
-            if not rec.material:
-                continue
-                
-            material_name = rec.material.material_name
-            if material_name not in material_stats:
-                material_stats[material_name] = {
-                    "count": 0,
-                    "total_co2": 0,
-                    "total_cost": 0,
-                    "total_score": 0,
-                    "material": rec.material
-                }
-            
-            stats = material_stats[material_name]
-            stats["count"] += 1
-            stats["total_co2"] += rec.co2_reduction_percent or 0
-            stats["total_cost"] += rec.cost_savings_percent or 0
-            stats["total_score"] += rec.recommendation_score or 0
-        
-        # Calculate averages and prepare insights
-        insights = []
-        for material_name, stats in material_stats.items():
-            if stats["count"] > 0:
-                insights.append({
-                    "material": material_name,
-                    "usage_count": stats["count"],
-                    "avg_co2_reduction": round(stats["total_co2"] / stats["count"], 1),
-                    "avg_cost_savings": round(stats["total_cost"] / stats["count"], 1),
-                    "avg_score": round(stats["total_score"] / stats["count"], 3),
-                    "recyclability": stats["material"].recyclability_percent,
-                    "strength": stats["material"].strength_rating,
-                    "cost_per_kg": stats["material"].cost_per_kg,
-                    "biodegradability": stats["material"].biodegradability_score
-                })
-        
-        # Sort by average score (highest first)
-        insights.sort(key=lambda x: x["avg_score"], reverse=True)
+        
+        # One row per material, aggregated in the database
+        avg_score = func.avg(Recommendation.recommendation_score)
+        rows = db.session.execute(
+            select(
+                Material.material_name,
+                func.count(Recommendation.id),
+                func.avg(Recommendation.co2_reduction_percent),
+                func.avg(Recommendation.cost_savings_percent),
+                avg_score,
+                Material.recyclability_percent,
+                Material.strength_rating,
+                Material.cost_per_kg,
+                Material.biodegradability_score
+            )
+            .join(Recommendation, Recommendation.material_id == Material.id)
+            .where(Recommendation.user_id == user_id)
+            .group_by(Material.id)
+            .order_by(avg_score.desc())  # Highest average score first
+        ).all()
+        
+        insights = [{
+            "material": name,
+            "usage_count": count,
+            "avg_co2_reduction": round(avg_co2 or 0, 1),
+            "avg_cost_savings": round(avg_cost or 0, 1),
+            "avg_score": round(avg_rec_score or 0, 3),
+            "recyclability": recyclability,
+            "strength": strength,
+            "cost_per_kg": cost_per_kg,
+            "biodegradability": biodegradability
+        } for (name, count, avg_co2, avg_cost, avg_rec_score,
+               recyclability, strength, cost_per_kg, biodegradability) in rows]
         
         return jsonify({"insights": insights}), 200
         
@@ -2,56 +2,112 @@ from flask import Flask, render_template, jsonify, redirect, url_for
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_login import LoginManager, logout_user
-from sqlalchemy import inspect
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
 import os
 
 from config import Config
 from database import db
+from cache import cache
 from models import User, Material, Product, Recommendation
+import models
 from auth import auth_bp
 from recommendations import recommendations_bp
 from analytics import analytics_bp
 
 
+# Column dtypes for materials_final.csv, matching the Material model
+MATERIAL_CSV_DTYPES = {
+    "material_name": str,
+    "strength_rating": int,
+    "weight_capacity_kg": float,
+    "biodegradability_score": int,
+    "recyclability_percent": float,
+    "co2_emission_score": float,
+    "cost_per_kg": float
+}
+
+
 def seed_materials():
     """Seed database with materials from CSV or create sample data"""
     if Material.query.first() is not None:
         print("✅ Materials already seeded")
         return
 
-    materials = []
-    
     # Try to load from CSV file if it exists
     csv_path = "materials_final.csv"
     if os.path.exists(csv_path):
         try:
             print(f"📂 Loading materials from {csv_path}...")
-            materials_df = pd.read_csv(csv_path)
+            materials_df = pd.read_csv(
+                csv_path,
+                usecols=list(MATERIAL_CSV_DTYPES),
+                dtype=MATERIAL_CSV_DTYPES
+            )
             
-            for _, row in materials_df.iterrows():
-                materials.append(Material(
-                    material_name=row['material_name'],
-                    strength_rating=int(row['strength_rating']),
-                    weight_capacity_kg=float(row['weight_capacity_kg']),
-                    biodegradability_score=int(row['biodegradability_score']),
-                    recyclability_percent=float(row['recyclability_percent']),
-                    co2_emission_score=float(row['co2_emission_score']),
-                    cost_per_kg=float(row['cost_per_kg'])
-                ))
-            print(f"✅ Seeded {len(materials)} materials from CSV")
+            # One executemany INSERT, no ORM objects
+            db.session.bulk_insert_mappings(Material, materials_df.to_dict("records"))
+            db.session.commit()
+            # Bulk inserts skip mapper events, so invalidate the material cache by hand
+            models.materials_version += 1
+            print(f"✅ Seeded {len(materials_df)} materials from CSV")
+            return
         except Exception as e:
+            db.session.rollback()
             print(f"❌ Failed to load CSV: {e}")
-            materials = create_sample_materials()
     else:
         print("📝 CSV not found, creating sample materials...")
-        materials = create_sample_materials()
     
+    materials = create_sample_materials()
     db.session.bulk_save_objects(materials)
     db.session.commit()
+    models.materials_version += 1
     print(f"✅ Database seeded with {len(materials)} materials")
 
 
+# pg_advisory_xact_lock key serializing ensure_created_at_defaults() across workers
+CREATED_AT_MIGRATION_LOCK = 7311020419
+
+
+def ensure_created_at_defaults():
+    """
+    created_at is filled by the database (server_default=now()) as timestamptz;
+    create_all() leaves existing tables alone, so bring older tables in line.
+    """
+    if db.engine.dialect.name == "postgresql":
+        with db.engine.begin() as conn:
+            # Every worker runs this at startup; the conversion must only ever
+            # happen once, so read the column types only while holding the lock
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CREATED_AT_MIGRATION_LOCK})
+            inspector = inspect(conn)
+            for model in (User, Product, Recommendation):
+                table = model.__tablename__
+                column = next(c for c in inspector.get_columns(table) if c["name"] == "created_at")
+                if not getattr(column["type"], "timezone", False):
+                    # Old rows were written with datetime.utcnow, i.e. naive UTC
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ALTER COLUMN created_at "
+                        f"TYPE timestamptz USING created_at AT TIME ZONE 'UTC'"
+                    ))
+                    print(f"🔄 Converted {table}.created_at to timestamptz")
+                if column["default"] is None:
+                    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT now()"))
+                    print(f"🔄 Added created_at default to {table}")
+        return
+
+    inspector = inspect(db.engine)
+    for model in (User, Product, Recommendation):
+        table = model.__tablename__
+        column = next(c for c in inspector.get_columns(table) if c["name"] == "created_at")
+        if column["default"] is None:
+            # SQLite can't add a column default; new rows would get NULL timestamps
+            raise RuntimeError(
+                f"{table}.created_at has no database default; "
+                f"recreate the database (delete the SQLite file) to pick up the new schema"
+            )
+
+
 def create_sample_materials():
     """Create sample materials for testing"""
     return [
@@ -120,6 +176,7 @@ def create_app():
 
     # Initialize extensions
     db.init_app(app)
+    cache.init_app(app)
     
     CORS(app, supports_credentials=True)
     
@@ -166,6 +223,16 @@ def create_app():
             print(f"⚠️ Schema check warning: {e}")
         
         db.create_all()
+        
+        # create_all() skips indexes on tables that already exist
+        for index in Recommendation.__table__.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                # e.g. duplicate rows already present for a unique index
+                print(f"⚠️ Could not create index {index.name}: {e}")
+        
+        ensure_created_at_defaults()
         seed_materials()
         print("🚀 Database ready!")
 
@@ -1,17 +1,52 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from flask_login import login_user, logout_user
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import create_access_token, get_jwt, verify_jwt_in_request
+from werkzeug.security import check_password_hash
+from sqlalchemy.exc import IntegrityError
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from database import db
 from models import User
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import hashlib
+import os
 import re
+import string
+import threading
+import time
 
 auth_bp = Blueprint("auth", __name__)
 
+# Argon2id password hashing (~46 MiB, 2 passes)
+ph = PasswordHasher(time_cost=2, memory_cost=47104, parallelism=1)
+
+# All password hashing/verification runs here, at most one per CPU at a time.
+# argon2-cffi releases the GIL, so a threaded worker keeps serving other
+# requests while a login hashes; size WSGI workers so that
+# workers * threads >= expected concurrent logins (e.g. gunicorn --threads).
+hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="pwhash")
+
+# Recently verified tokens: sha256(Authorization header) -> (user_id, exp)
+_jwt_cache = TTLCache(maxsize=10000, ttl=30)
+_jwt_cache_lock = threading.Lock()
+
+# Recent password checks: keyed blake2b(stored hash, password) -> bool.
+# The key is random per process and only the outcome is kept, so entries
+# reveal nothing about passwords; repeated identical attempts within 5s
+# (retry storms, credential stuffing) skip the Argon2 work.
+_login_cache = TTLCache(maxsize=5000, ttl=5)
+_login_cache_lock = threading.Lock()
+LOGIN_CACHE_KEY = os.urandom(32)
+
 # Validation patterns
 EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
-USERNAME_REGEX = re.compile(r"^[a-zA-Z0-9_]{3,20}$")
-PASSWORD_REGEX = re.compile(r"^(?=.*[A-Za-z])(?=.*\d)[^\s]{8,}$")
+USERNAME_REGEX = re.compile(r"[a-zA-Z0-9_]{3,20}", re.ASCII)
+
+# Password rules: 8+ characters, no whitespace, at least one letter and one digit
+PASSWORD_LETTERS = frozenset(string.ascii_letters)
+PASSWORD_DIGITS = frozenset(string.digits)
 
 
 def is_valid_email(email):
@@ -19,11 +54,106 @@ def is_valid_email(email):
 
 
 def is_valid_username(username):
-    return USERNAME_REGEX.match(username)
+    return USERNAME_REGEX.fullmatch(username)
 
 
 def is_strong_password(password):
-    return PASSWORD_REGEX.match(password)
+    # Set checks over the distinct characters instead of a lookahead regex
+    if len(password) < 8:
+        return False
+    chars = set(password)
+    return (
+        not chars.isdisjoint(PASSWORD_LETTERS)
+        and not chars.isdisjoint(PASSWORD_DIGITS)
+        and not any(c.isspace() for c in chars)
+    )
+
+
+def hash_password(password):
+    return hash_pool.submit(ph.hash, password).result()
+
+
+def argon2_matches(stored, password):
+    try:
+        return ph.verify(stored, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def login_cache_key(stored, password):
+    return hashlib.blake2b(
+        f"{stored}\0{password}".encode(), digest_size=16, key=LOGIN_CACHE_KEY
+    ).digest()
+
+
+def verify_password(user, password):
+    """
+    Check a password against the user's stored hash.
+    Legacy werkzeug (pbkdf2/scrypt) hashes and outdated Argon2 parameters
+    are re-hashed on successful login.
+    """
+    # Keyed on the stored hash, so a password change or rehash misses the cache
+    key = login_cache_key(user.password_hash, password)
+    with _login_cache_lock:
+        cached = _login_cache.get(key)
+    if cached is not None:
+        return cached
+
+    ok = check_and_upgrade_password(user, password)
+    with _login_cache_lock:
+        _login_cache[key] = ok
+    return ok
+
+
+def check_and_upgrade_password(user, password):
+    stored = user.password_hash
+    if stored.startswith("$argon2"):
+        if not hash_pool.submit(argon2_matches, stored, password).result():
+            return False
+        needs_rehash = ph.check_needs_rehash(stored)
+    else:
+        if not hash_pool.submit(check_password_hash, stored, password).result():
+            return False
+        needs_rehash = True
+
+    if needs_rehash:
+        user.password_hash = hash_password(password)
+        db.session.commit()
+    return True
+
+
+def token_cache_key():
+    return hashlib.sha256(request.headers.get("Authorization", "").encode()).hexdigest()
+
+
+def cached_jwt_required(fn):
+    """
+    Like @jwt_required(), but a token verified in the last 30s is accepted
+    from a process-local cache instead of being decoded again.
+    Use current_user_id() inside the view instead of get_jwt_identity().
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = token_cache_key()
+        with _jwt_cache_lock:
+            entry = _jwt_cache.get(key)
+
+        if entry is None or entry[1] <= time.time():
+            verify_jwt_in_request()  # Raises into the JWT error handlers on failure
+            jwt_data = get_jwt()
+            entry = (int(jwt_data["sub"]), jwt_data["exp"])
+            with _jwt_cache_lock:
+                _jwt_cache[key] = entry
+
+        g.jwt_user_id = entry[0]
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def current_user_id():
+    """User id of the token accepted by @cached_jwt_required"""
+    return g.jwt_user_id
 
 
 # ================= REGISTER ================= #
@@ -55,22 +185,22 @@ def register():
                 "error": "Password must be at least 8 characters with letters and numbers"
             }), 400
 
-        # Check for existing user
-        if User.query.filter_by(username=username).first():
-            return jsonify({"error": "Username already exists"}), 400
-
-        if User.query.filter_by(email=email).first():
-            return jsonify({"error": "Email already exists"}), 400
-
-        # Create new user
+        # Create new user; the unique indexes on username/email reject duplicates
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=hash_password(password)
         )
 
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            # SQLite: "users.username", Postgres: "Key (username)=..."
+            message = str(e.orig)
+            field = "Username" if "users.username" in message or "(username)" in message else "Email"
+            return jsonify({"error": f"{field} already exists"}), 400
 
         # Login for session-based templates
         login_user(user, remember=True)
@@ -109,7 +239,7 @@ def login():
 
         user = User.query.filter_by(username=username).first()
 
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not verify_password(user, password):
             return jsonify({"error": "Invalid username or password"}), 401
 
         # Login for session-based templates
@@ -133,11 +263,11 @@ def login():
 
 # ================= PROFILE ================= #
 @auth_bp.route("/profile", methods=["GET"])
-@jwt_required()
+@cached_jwt_required
 def profile():
     try:
-        user_id = int(get_jwt_identity())
-        user = User.query.get(user_id)
+        user_id = current_user_id()
+        user = db.session.get(User, user_id)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -156,5 +286,7 @@ def profile():
 # ================= LOGOUT ================= #
 @auth_bp.route("/logout", methods=["POST", "GET"])
 def logout():
+    with _jwt_cache_lock:
+        _jwt_cache.pop(token_cache_key(), None)
     logout_user()
     return jsonify({"message": "Logged out successfully"}), 200
\ No newline at end of file
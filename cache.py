@@ -0,0 +1,4 @@
+from flask_caching import Cache
+
+# Create Cache instance
+cache = Cache()
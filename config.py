@@ -14,6 +14,20 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool; compiled SQL is already reused via SQLAlchemy's
+    # built-in LRU statement cache (query_cache_size, 500 entries)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+    if SQLALCHEMY_DATABASE_URI.startswith("postgresql"):
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+            # Generous enough for streamed CSV exports, which hold a cursor open
+            connect_args={"options": f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000')}"},
+        )
+
     # Flask configuration
     SECRET_KEY = os.getenv("SECRET_KEY", "ecopackai-secure-key-2024")
     DEBUG = os.getenv("DEBUG", "true").lower() == "true"
@@ -26,6 +40,10 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)
     JWT_ALGORITHM = "HS256"
+
+    # Cache configuration
+    CACHE_TYPE = os.getenv("CACHE_TYPE", "SimpleCache")
+    CACHE_DEFAULT_TIMEOUT = 300
     
     # Security headers
     SESSION_COOKIE_HTTPONLY = True
@@ -1,11 +1,12 @@
 
+from sqlalchemy.orm import selectinload
 from app import create_app
 from models import Recommendation, Material, User
 
 app = create_app()
 
 with app.app_context():
-    recs = Recommendation.query.all()
+    recs = Recommendation.query.options(selectinload(Recommendation.material)).all()
     materials = Material.query.all()
     users = User.query.all()
     
@@ -1,6 +1,13 @@
 from flask_login import UserMixin
+from sqlalchemy import case, event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.hybrid import hybrid_property
 from database import db
-from datetime import datetime
+
+# Bumped after every commit that changed a Material through the ORM; caches of
+# material data rebuild when it differs from the version they were built from
+# (see recommendations.py)
+materials_version = 0
 
 # ================= USER MODEL ================= #
 class User(UserMixin, db.Model):
@@ -10,7 +17,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
 
     # Relationships
     products = db.relationship("Product", backref="user", lazy=True, cascade="all, delete-orphan")
@@ -34,7 +41,7 @@ class Material(db.Model):
     cost_per_kg = db.Column(db.Float, nullable=False)
 
     # Relationships
-    recommendations = db.relationship("Recommendation", backref="material", lazy=True)
+    recommendations = db.relationship("Recommendation", back_populates="material", lazy=True)
 
     def calculate_eco_score(self):
         """Calculate overall eco-friendliness score (0-10)"""
@@ -43,10 +50,46 @@ class Material(db.Model):
         co2 = max(0, 10 - (self.co2_emission_score * 2)) * 0.3  # 30% weight (lower CO2 = better)
         return round(bio + recycle + co2, 2)
 
+    @hybrid_property
+    def eco_score(self):
+        return self.calculate_eco_score()
+
+    @eco_score.expression
+    def eco_score(cls):
+        """Same formula in SQL (unrounded), so it can be selected, filtered or ordered on"""
+        co2 = 10 - cls.co2_emission_score * 2
+        return (
+            (cls.biodegradability_score / 10.0) * 4
+            + (cls.recyclability_percent / 100.0) * 3
+            + case((co2 > 0, co2), else_=0) * 0.3
+        )
+
     def __repr__(self):
         return f"<Material {self.material_name}>"
 
 
+@event.listens_for(Material, "after_insert")
+@event.listens_for(Material, "after_update")
+@event.listens_for(Material, "after_delete")
+def mark_materials_changed(mapper, connection, target):
+    # Only counts once committed, so a cache rebuild never pins uncommitted state
+    session = object_session(target)
+    if session is not None:
+        session.info["materials_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def bump_materials_version(session):
+    global materials_version
+    if session.info.pop("materials_changed", False):
+        materials_version += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_materials_changed(session):
+    session.info.pop("materials_changed", None)
+
+
 # ================= PRODUCT MODEL ================= #
 class Product(db.Model):
     __tablename__ = "products"
@@ -60,10 +103,10 @@ class Product(db.Model):
     fragility_level = db.Column(db.Integer, nullable=False)  # 1-10 scale
     temperature_sensitive = db.Column(db.Boolean, default=False)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
 
     # Relationships
-    recommendations = db.relationship("Recommendation", backref="product", lazy=True, cascade="all, delete-orphan")
+    recommendations = db.relationship("Recommendation", back_populates="product", lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Product {self.product_name} ({self.food_type})>"
@@ -72,6 +115,12 @@ class Product(db.Model):
 # ================= RECOMMENDATION MODEL ================= #
 class Recommendation(db.Model):
     __tablename__ = "recommendations"
+    __table_args__ = (
+        # Every analytics/history query filters by user and most order or slice by date
+        db.Index("ix_recs_user_created", "user_id", "created_at"),
+        # A material is saved at most once per user and product
+        db.Index("uq_rec_user_prod_mat", "user_id", "product_id", "material_id", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     
@@ -83,7 +132,11 @@ class Recommendation(db.Model):
     co2_reduction_percent = db.Column(db.Float, nullable=False)
     cost_savings_percent = db.Column(db.Float, nullable=False)
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+
+    # Relationships
+    material = db.relationship("Material", back_populates="recommendations")
+    product = db.relationship("Product", back_populates="recommendations")
 
     def __repr__(self):
         return f"<Recommendation score={self.recommendation_score}>"
\ No newline at end of file
@@ -1,17 +1,35 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, request, jsonify
+from collections import namedtuple
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+import numpy as np
+import orjson
+import threading
+try:
+    from numba import njit
+except ImportError:  # Optional: MaterialMatrix.scores falls back to plain NumPy
+    njit = None
+from auth import cached_jwt_required, current_user_id
 from database import db
-from models import User, Material, Product, Recommendation
+from models import Material, Product, Recommendation
+import models
 
 recommendations_bp = Blueprint("recommendations", __name__)
 
+# History page size: default and upper bound for ?per_page=
+HISTORY_PER_PAGE = 50
+HISTORY_MAX_PER_PAGE = 200
+
 
 # ================= SCORING ALGORITHM ================= #
-def calculate_material_score(material, product):
-    """
-    Calculate suitability score for a material (0-10)
-    Higher score = better match for the product
-    """
+BASELINE_CO2 = 3.0  # Average CO2 score of traditional packaging
+BASELINE_COST = 3.5  # Average cost per kg of traditional packaging
+
+
+def bucket_weights(bucket, temperature_sensitive):
+    """Scoring weights (bio, recyc, strength, co2, cost) for one product bucket"""
     # Base weights
     w_bio = 0.20      # Biodegradability importance
     w_recyc = 0.20    # Recyclability importance
@@ -20,19 +38,51 @@ def calculate_material_score(material, product):
     w_cost = 0.20     # Cost importance
 
     # Adjust weights based on product characteristics
-    if product.fragility_level >= 7:  # Very fragile items
+    if bucket == "fragile":  # Very fragile items
         w_strength = 0.40
         w_cost = 0.10
         w_co2 = 0.10
-    elif product.fragility_level <= 3:  # Sturdy items
+    elif bucket == "sturdy":  # Sturdy items
         w_strength = 0.10
         w_cost = 0.30
         w_co2 = 0.20
 
-    if product.temperature_sensitive:
+    if temperature_sensitive:
         w_strength += 0.10
         w_cost -= 0.05
 
+    return w_bio, w_recyc, w_strength, w_co2, w_cost
+
+
+# Weights only depend on (fragility bucket, temperature_sensitive): all six
+# combinations are evaluated once at import
+WEIGHTS = {
+    (bucket, temperature_sensitive): bucket_weights(bucket, temperature_sensitive)
+    for bucket in ("fragile", "normal", "sturdy")
+    for temperature_sensitive in (True, False)
+}
+
+
+def fragility_bucket(fragility_level):
+    if fragility_level >= 7:
+        return "fragile"
+    if fragility_level <= 3:
+        return "sturdy"
+    return "normal"
+
+
+def product_weights(product):
+    """Scoring weights (bio, recyc, strength, co2, cost) for a product"""
+    return WEIGHTS[fragility_bucket(product.fragility_level), bool(product.temperature_sensitive)]
+
+
+def calculate_material_score(material, weights):
+    """
+    Calculate suitability score for a material (0-10)
+    Higher score = better match for the product weights (see product_weights)
+    """
+    w_bio, w_recyc, w_strength, w_co2, w_cost = weights
+
     # Normalize scores (0-10 scale)
     s_bio = material.biodegradability_score  # Already 1-10
     s_recyc = material.recyclability_percent / 10.0  # Convert 0-100 to 0-10
@@ -54,72 +104,237 @@ def calculate_material_score(material, product):
 
 def calculate_impact_metrics(material):
     """Calculate CO2 reduction and cost savings percentages"""
-    # Baseline values (average traditional packaging)
-    baseline_co2 = 3.0  # Average CO2 score
-    baseline_cost = 3.5  # Average cost per kg
-
-    co2_reduction = max(0, ((baseline_co2 - material.co2_emission_score) / baseline_co2) * 100)
-    cost_savings = max(0, ((baseline_cost - material.cost_per_kg) / baseline_cost) * 100)
+    co2_reduction = max(0, ((BASELINE_CO2 - material.co2_emission_score) / BASELINE_CO2) * 100)
+    cost_savings = max(0, ((BASELINE_COST - material.cost_per_kg) / BASELINE_COST) * 100)
 
     return round(co2_reduction, 2), round(cost_savings, 2)
 
 
+# ================= VECTORIZED SCORING ================= #
+def py_round(values, ndigits):
+    """
+    Element-wise built-in round(). np.round gives different results at some
+    halfway values (np.round(5.825, 2) == 5.82, round(5.825, 2) == 5.83), and
+    scores must match the scalar functions above exactly.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, ndigits)
+    # Away from a ...5 boundary both pick the same digit and divide it back the
+    # same way; only the few near-halfway entries go through round()
+    scaled = values * 10.0 ** ndigits
+    halfway = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    if len(halfway):
+        flat = rounded.reshape(-1)
+        flat[halfway] = [round(v, ndigits) for v in values.reshape(-1)[halfway].tolist()]
+    return rounded
+
+
+def weighted_score_kernel(bio, recyc, strength, co2, cost, w_bio, w_recyc, w_strength, w_co2, w_cost):
+    """Unrounded calculate_material_score sum for every material, as one loop"""
+    n = bio.shape[0]
+    out = np.empty(n)
+    for i in range(n):
+        s_co2 = max(0.0, 10.0 - co2[i] * 2.0)
+        s_cost = max(0.0, 10.0 - cost[i] * 2.0)
+        out[i] = (
+            bio[i] * w_bio +
+            (recyc[i] / 10.0) * w_recyc +
+            strength[i] * w_strength +
+            s_co2 * w_co2 +
+            s_cost * w_cost
+        )
+    return out
+
+
+# Compiled once per Python/numba version and cached in __pycache__. No
+# fastmath: reassociating the sum would change scores near rounding edges.
+if njit is not None:
+    weighted_score_kernel = njit(cache=True)(weighted_score_kernel)
+
+
+class MaterialMatrix:
+    """Material columns as contiguous float arrays, for scoring every material in one pass"""
+
+    def __init__(self, materials):
+        self.materials = materials
+        self.bio = np.array([m.biodegradability_score for m in materials], dtype=np.float64)
+        self.recyc = np.array([m.recyclability_percent for m in materials], dtype=np.float64)
+        self.strength = np.array([m.strength_rating for m in materials], dtype=np.float64)
+        self.co2 = np.array([m.co2_emission_score for m in materials], dtype=np.float64)
+        self.cost = np.array([m.cost_per_kg for m in materials], dtype=np.float64)
+
+        # Impact metrics depend only on the material, so compute them once per cache build
+        co2_reduction = np.maximum(0, (BASELINE_CO2 - self.co2) / BASELINE_CO2 * 100)
+        cost_savings = np.maximum(0, (BASELINE_COST - self.cost) / BASELINE_COST * 100)
+        self.co2_reduction = py_round(co2_reduction, 2)
+        self.cost_savings = py_round(cost_savings, 2)
+
+    def __len__(self):
+        return len(self.materials)
+
+    def scores(self, weights):
+        """calculate_material_score for every material at once (0-10)"""
+        if njit is not None:
+            score = weighted_score_kernel(
+                self.bio, self.recyc, self.strength, self.co2, self.cost, *map(float, weights)
+            )
+            return np.clip(py_round(score, 2), 0, 10)
+
+        w_bio, w_recyc, w_strength, w_co2, w_cost = weights
+        score = (
+            self.bio * w_bio +
+            (self.recyc / 10.0) * w_recyc +
+            self.strength * w_strength +
+            np.maximum(0, 10 - self.co2 * 2) * w_co2 +
+            np.maximum(0, 10 - self.cost * 2) * w_cost
+        )
+        return np.clip(py_round(score, 2), 0, 10)
+
+    def score_matrix(self, weights):
+        """scores() for M weight tuples at once, as an (M, N) array"""
+        w = np.asarray(weights, dtype=np.float64)
+        score = (
+            self.bio * w[:, 0:1] +
+            (self.recyc / 10.0) * w[:, 1:2] +
+            self.strength * w[:, 2:3] +
+            np.maximum(0, 10 - self.co2 * 2) * w[:, 3:4] +
+            np.maximum(0, 10 - self.cost * 2) * w[:, 4:5]
+        )
+        return np.clip(py_round(score, 2), 0, 10)
+
+    def impact_metrics(self):
+        """calculate_impact_metrics for every material (precomputed, read-only)"""
+        return self.co2_reduction, self.cost_savings
+
+
+# ================= MATERIAL CACHE ================= #
+# Detached, read-only copy of a materials row plus its SQL-computed eco_score;
+# duck-types the Material attributes
+MaterialRow = namedtuple("MaterialRow", [column.name for column in Material.__table__.columns] + ["eco_score"])
+
+# Replaced as a whole on rebuild, so readers always see one consistent version
+_material_cache = {"version": None}
+_material_cache_lock = threading.Lock()
+
+
+def get_materials_cached():
+    """
+    All materials as MaterialRow tuples, plus an id index, a MaterialMatrix
+    and the serialized /materials response (built on first use).
+    Rebuilt only after a committed Material insert/update/delete
+    (models.materials_version).
+    """
+    global _material_cache
+    cache = _material_cache
+    if cache["version"] == models.materials_version:
+        return cache
+
+    with _material_cache_lock:
+        cache = _material_cache
+        version = models.materials_version
+        if cache["version"] != version:
+            # Build into locals; if the query fails the version stays stale
+            # and the next call retries instead of serving an empty cache
+            result = db.session.execute(
+                select(*Material.__table__.columns, Material.eco_score.label("eco_score")).order_by(Material.id)
+            )
+            rows = [MaterialRow._make(row) for row in result]
+            cache = {
+                "version": version,
+                "rows": rows,
+                "by_id": {row.id: row for row in rows},
+                "matrix": MaterialMatrix(rows),
+                "list_json": None
+            }
+            _material_cache = cache
+    return cache
+
+
+def top_k_indices(scores, k):
+    """
+    Indices of the k highest scores, best first, in O(N).
+    Ties keep their original order, same as a stable sort.
+    """
+    if len(scores) <= k:
+        idx = np.arange(len(scores))
+    else:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]  # k-th largest
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        idx = np.concatenate([above, ties])
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
 # ================= RECOMMEND MATERIALS ================= #
+REQUIRED_PRODUCT_FIELDS = ["product_name", "food_type", "weight_kg", "fragility_level"]
+BATCH_MAX_PRODUCTS = 100
+
+
+def build_product(data, user_id):
+    """Product from a recommend payload; raises ValueError on bad numbers"""
+    return Product(
+        user_id=user_id,
+        product_name=data["product_name"].strip(),
+        food_type=data["food_type"].strip(),
+        weight_kg=float(data["weight_kg"]),
+        fragility_level=int(data["fragility_level"]),
+        temperature_sensitive=bool(data.get("temperature_sensitive", False))
+    )
+
+
+def top_recommendations(matrix, scores, co2_reduction, cost_savings, k=10):
+    """
+    Response dicts for the k best-scoring materials, best first.
+    scores are 0-10 (2 decimals); score/10 to 3 decimals keeps their order
+    and ties, so only the returned k are normalized.
+    """
+    # Only the top k are returned, so only those are turned into dicts
+    results = []
+    for i in top_k_indices(scores, k):
+        material = matrix.materials[i]
+        results.append({
+            "material_id": material.id,
+            "material_name": material.material_name,
+            "score": round(float(scores[i]) / 10, 3),  # Normalize to 0-1
+            "co2_reduction_percent": float(co2_reduction[i]),
+            "cost_savings_percent": float(cost_savings[i]),
+            "recyclability": material.recyclability_percent,
+            "strength": material.strength_rating,
+            "cost_per_kg": material.cost_per_kg,
+            "biodegradability": material.biodegradability_score,
+            "weight_capacity": material.weight_capacity_kg
+        })
+    return results
+
+
 @recommendations_bp.route("/recommend", methods=["POST"])
-@jwt_required()
+@cached_jwt_required
 def recommend_materials():
     try:
-        user_id = int(get_jwt_identity())
-        
-        # Verify user exists
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({"error": "User not found"}), 401
-
+        user_id = current_user_id()
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ["product_name", "food_type", "weight_kg", "fragility_level"]
-        for field in required_fields:
+        for field in REQUIRED_PRODUCT_FIELDS:
             if field not in data:
                 return jsonify({"error": f"Missing field: {field}"}), 400
 
         # Create product record
-        product = Product(
-            user_id=user_id,
-            product_name=data["product_name"].strip(),
-            food_type=data["food_type"].strip(),
-            weight_kg=float(data["weight_kg"]),
-            fragility_level=int(data["fragility_level"]),
-            temperature_sensitive=bool(data.get("temperature_sensitive", False))
-        )
+        product = build_product(data, user_id)
 
         db.session.add(product)
-        db.session.flush()  # Get product ID without committing
-
-        # Get all materials and score them
-        materials = Material.query.all()
-        results = []
-
-        for material in materials:
-            score = calculate_material_score(material, product)
-            co2_reduction, cost_savings = calculate_impact_metrics(material)
-            
-            results.append({
-                "material_id": material.id,
-                "material_name": material.material_name,
-                "score": round(score / 10, 3),  # Normalize to 0-1
-                "co2_reduction_percent": co2_reduction,
-                "cost_savings_percent": cost_savings,
-                "recyclability": material.recyclability_percent,
-                "strength": material.strength_rating,
-                "cost_per_kg": material.cost_per_kg,
-                "biodegradability": material.biodegradability_score,
-                "weight_capacity": material.weight_capacity_kg
-            })
+        try:
+            db.session.flush()  # Get product ID without committing
+        except IntegrityError:
+            # products.user_id FK: the token's user no longer exists
+            db.session.rollback()
+            return jsonify({"error": "User not found"}), 401
 
-        # Sort by score (highest first)
-        results.sort(key=lambda x: x["score"], reverse=True)
+        # Get all materials and score them in one vectorized pass
+        matrix = get_materials_cached()["matrix"]
+        scores = matrix.scores(product_weights(product))
+        co2_reduction, cost_savings = matrix.impact_metrics()
+        results = top_recommendations(matrix, scores, co2_reduction, cost_savings)
         
         # Save top recommendation
         if results:
@@ -139,8 +354,8 @@ def recommend_materials():
         return jsonify({
             "product_id": product.id,
             "product_name": product.product_name,
-            "total_materials": len(results),
-            "recommendations": results[:10]  # Return top 10
+            "total_materials": len(matrix),
+            "recommendations": results  # Top 10
         }), 200
 
     except ValueError as e:
@@ -152,38 +367,141 @@ def recommend_materials():
         return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
 
 
+# ================= BATCH RECOMMEND ================= #
+@recommendations_bp.route("/recommend/batch", methods=["POST"])
+@cached_jwt_required
+def recommend_materials_batch():
+    """Same as /recommend for up to BATCH_MAX_PRODUCTS products in one transaction"""
+    try:
+        user_id = current_user_id()
+        data = request.get_json()
+
+        items = data.get("products") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "products must be a non-empty list"}), 400
+        if len(items) > BATCH_MAX_PRODUCTS:
+            return jsonify({"error": f"At most {BATCH_MAX_PRODUCTS} products per batch"}), 400
+
+        # Validate required fields
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                return jsonify({"error": f"Product {index} must be an object"}), 400
+            for field in REQUIRED_PRODUCT_FIELDS:
+                if field not in item:
+                    return jsonify({"error": f"Missing field: {field} (product {index})"}), 400
+
+        # Create product records; one flush assigns all ids
+        products = [build_product(item, user_id) for item in items]
+        db.session.add_all(products)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # products.user_id FK: the token's user no longer exists
+            db.session.rollback()
+            return jsonify({"error": "User not found"}), 401
+
+        # Score every product against every material as one (M, N) array
+        matrix = get_materials_cached()["matrix"]
+        scores = matrix.score_matrix([product_weights(p) for p in products])
+        co2_reduction, cost_savings = matrix.impact_metrics()
+
+        results = []
+        saved = []
+        for product, product_scores in zip(products, scores):
+            recommendations = top_recommendations(matrix, product_scores, co2_reduction, cost_savings)
+            if recommendations:
+                top_recommendation = recommendations[0]
+                saved.append({
+                    "user_id": user_id,
+                    "product_id": product.id,
+                    "material_id": top_recommendation["material_id"],
+                    "recommendation_score": top_recommendation["score"],
+                    "co2_reduction_percent": top_recommendation["co2_reduction_percent"],
+                    "cost_savings_percent": top_recommendation["cost_savings_percent"]
+                })
+            results.append({
+                "product_id": product.id,
+                "product_name": product.product_name,
+                "recommendations": recommendations  # Top 10
+            })
+
+        # Save each product's top recommendation in one executemany
+        db.session.bulk_insert_mappings(Recommendation, saved)
+        db.session.commit()
+
+        return jsonify({
+            "total_materials": len(matrix),
+            "results": results
+        }), 200
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"Invalid input data: {str(e)}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Batch recommendation error: {str(e)}")
+        return jsonify({"error": f"Batch analysis failed: {str(e)}"}), 500
+
+
 # ================= GET HISTORY ================= #
 @recommendations_bp.route("/history", methods=["GET"])
-@jwt_required()
+@cached_jwt_required
 def recommendation_history():
     try:
-        user_id = int(get_jwt_identity())
+        user_id = current_user_id()
         
-        # Get user's recommendations
-        recs = Recommendation.query.filter_by(
-            user_id=user_id
-        ).order_by(Recommendation.created_at.desc()).all()
+        page = max(request.args.get("page", 1, type=int), 1)
+        per_page = min(max(request.args.get("per_page", HISTORY_PER_PAGE, type=int), 1), HISTORY_MAX_PER_PAGE)
+
+        total = db.session.scalar(
+            select(func.count(Recommendation.id)).where(Recommendation.user_id == user_id)
+        )
+
+        # One page of plain rows; no ORM objects or relationship loading
+        rows = db.session.execute(
+            select(
+                Recommendation.id,
+                Recommendation.recommendation_score,
+                Recommendation.co2_reduction_percent,
+                Recommendation.cost_savings_percent,
+                Recommendation.created_at,
+                Material.material_name,
+                Material.recyclability_percent,
+                Material.strength_rating,
+                Material.cost_per_kg,
+                Material.biodegradability_score,
+                Product.product_name
+            )
+            .outerjoin(Material, Recommendation.material_id == Material.id)
+            .outerjoin(Product, Recommendation.product_id == Product.id)
+            .where(Recommendation.user_id == user_id)
+            .order_by(Recommendation.created_at.desc(), Recommendation.id.desc())
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+        )
 
         history = []
-        for rec in recs:
+        for row in rows:
             history.append({
-                "id": rec.id,
-                "material_name": rec.material.material_name if rec.material else "Unknown",
-                "product_name": rec.product.product_name if rec.product else "Unknown",
-                "recommendation_score": rec.recommendation_score,
-                "co2_reduction_percent": rec.co2_reduction_percent,
-                "cost_savings_percent": rec.cost_savings_percent,
-                "created_at": rec.created_at.isoformat(),
+                "id": row.id,
+                "material_name": row.material_name or "Unknown",
+                "product_name": row.product_name or "Unknown",
+                "recommendation_score": row.recommendation_score,
+                "co2_reduction_percent": row.co2_reduction_percent,
+                "cost_savings_percent": row.cost_savings_percent,
+                "created_at": row.created_at.isoformat(),
                 "material_details": {
-                    "recyclability_percent": rec.material.recyclability_percent if rec.material else 0,
-                    "strength_rating": rec.material.strength_rating if rec.material else 0,
-                    "cost_per_kg": rec.material.cost_per_kg if rec.material else 0,
-                    "biodegradability": rec.material.biodegradability_score if rec.material else 0
+                    "recyclability_percent": row.recyclability_percent or 0,
+                    "strength_rating": row.strength_rating or 0,
+                    "cost_per_kg": row.cost_per_kg or 0,
+                    "biodegradability": row.biodegradability_score or 0
                 }
             })
 
         return jsonify({
-            "total": len(history),
+            "total": total,
+            "page": page,
+            "per_page": per_page,
             "recommendations": history
         }), 200
 
@@ -193,38 +511,56 @@ def recommendation_history():
 
 # ================= LIST MATERIALS ================= #
 @recommendations_bp.route("/materials", methods=["GET"])
-@jwt_required()
+@cached_jwt_required
 def list_materials():
     try:
-        materials = Material.query.all()
-        
-        material_list = []
-        for material in materials:
-            material_list.append({
-                "id": material.id,
-                "material_name": material.material_name,
-                "eco_score": material.calculate_eco_score(),
-                "cost_per_kg": material.cost_per_kg,
-                "recyclability": material.recyclability_percent,
-                "strength": material.strength_rating,
-                "co2_impact": material.co2_emission_score
+        cached = get_materials_cached()
+
+        # The catalogue only changes with the material cache, so encode it once
+        if cached["list_json"] is None:
+            materials = cached["rows"]
+            cached["list_json"] = orjson.dumps({
+                "materials": [
+                    {
+                        "id": material.id,
+                        "material_name": material.material_name,
+                        "eco_score": round(material.eco_score, 2),
+                        "cost_per_kg": material.cost_per_kg,
+                        "recyclability": material.recyclability_percent,
+                        "strength": material.strength_rating,
+                        "co2_impact": material.co2_emission_score
+                    }
+                    for material in materials
+                ],
+                "total": len(materials)
             })
 
-        return jsonify({
-            "materials": material_list,
-            "total": len(material_list)
-        }), 200
+        return Response(cached["list_json"], status=200, mimetype="application/json")
 
     except Exception as e:
         return jsonify({"error": f"Failed to fetch materials: {str(e)}"}), 500
 
 
 # ================= SAVE SPECIFIC RECOMMENDATION ================= #
+DIALECT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+
+def insert_recommendation_once(**values):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING id, in one round-trip.
+    Returns None when the row already exists.
+    """
+    insert = DIALECT_INSERTS[db.session.get_bind().dialect.name]
+    return db.session.scalar(
+        insert(Recommendation).values(**values).on_conflict_do_nothing().returning(Recommendation.id)
+    )
+
+
 @recommendations_bp.route("/save", methods=["POST"])
-@jwt_required()
+@cached_jwt_required
 def save_recommendation():
     try:
-        user_id = int(get_jwt_identity())
+        user_id = current_user_id()
         data = request.get_json()
         
         product_id = data.get("product_id")
@@ -233,39 +569,44 @@ def save_recommendation():
         if not product_id or not material_id:
             return jsonify({"error": "Missing product_id or material_id"}), 400
             
-        # Check if product exists and belongs to user
-        product = Product.query.filter_by(id=product_id, user_id=user_id).first()
+        # Check if product exists and belongs to user; only the columns
+        # product_weights() reads are fetched, no ORM object is built
+        product = db.session.execute(
+            select(Product.id, Product.fragility_level, Product.temperature_sensitive)
+            .filter_by(id=product_id, user_id=user_id)
+        ).first()
         if not product:
             return jsonify({"error": "Product not found"}), 404
             
         # Check if material exists
-        material = Material.query.get(material_id)
+        material = get_materials_cached()["by_id"].get(int(material_id))
         if not material:
             return jsonify({"error": "Material not found"}), 404
             
         # Recalculate metrics for this pair
-        from recommendations import calculate_material_score, calculate_impact_metrics
-        score = calculate_material_score(material, product)
+        score = calculate_material_score(material, product_weights(product))
         co2_reduction, cost_savings = calculate_impact_metrics(material)
         
-        # Check if already exists
-        existing = Recommendation.query.filter_by(
-            user_id=user_id, product_id=product_id, material_id=material_id
-        ).first()
-        if existing:
-            return jsonify({"message": "Already saved", "id": existing.id}), 200
-            
-        new_rec = Recommendation(
+        # Insert unless this user already saved the pair (uq_rec_user_prod_mat)
+        rec_id = insert_recommendation_once(
             user_id=user_id,
-            product_id=product_id,
-            material_id=material_id,
+            product_id=product.id,
+            material_id=material.id,
             recommendation_score=round(score / 10, 3),
             co2_reduction_percent=co2_reduction,
             cost_savings_percent=cost_savings
         )
-        db.session.add(new_rec)
+        if rec_id is None:
+            existing_id = db.session.scalar(
+                select(Recommendation.id).filter_by(
+                    user_id=user_id, product_id=product.id, material_id=material.id
+                )
+            )
+            db.session.rollback()
+            return jsonify({"message": "Already saved", "id": existing_id}), 200
+            
         db.session.commit()
-        return jsonify({"message": "Analysis saved!", "id": new_rec.id}), 201
+        return jsonify({"message": "Analysis saved!", "id": rec_id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
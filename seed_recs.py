@@ -1,6 +1,7 @@
 
 from app import create_app, db
 from models import User, Product, Material, Recommendation
+from sqlalchemy import select
 import random
 from datetime import datetime, timedelta
 
@@ -17,46 +18,44 @@ with app.app_context():
         
     print(f"👤 Seeding for user: {user.username}")
     
-    # Get materials
-    materials = Material.query.all()
-    if not materials:
+    # Get material ids
+    material_ids = db.session.scalars(select(Material.id)).all()
+    if not material_ids:
         print("❌ No materials found.")
         exit()
         
-    # Create products
-    products = []
-    for i in range(5):
-        p = Product(
-            user_id=user.id,
-            product_name=f"Test Product {i+1}",
-            food_type="Dry",
-            weight_kg=0.5,
-            fragility_level=5
-        )
-        db.session.add(p)
-        products.append(p)
-    db.session.commit()
+    # Create products (return_defaults fills in the generated ids)
+    products = [
+        {
+            "user_id": user.id,
+            "product_name": f"Test Product {i+1}",
+            "food_type": "Dry",
+            "weight_kg": 0.5,
+            "fragility_level": 5
+        }
+        for i in range(5)
+    ]
+    db.session.bulk_insert_mappings(Product, products, return_defaults=True)
     
     # Create recommendations
     base_date = datetime.now() - timedelta(days=180)
     
-    for i in range(20):
-        # random date in last 6 months
-        created_at = base_date + timedelta(days=random.randint(0, 180))
-        
-        product = random.choice(products)
-        material = random.choice(materials)
-        
-        rec = Recommendation(
-            user_id=user.id,
-            product_id=product.id,
-            material_id=material.id,
-            recommendation_score=random.uniform(0.7, 0.99),
-            co2_reduction_percent=random.uniform(10, 80),
-            cost_savings_percent=random.uniform(5, 40),
-            created_at=created_at
-        )
-        db.session.add(rec)
-        
+    # Distinct (product, material) pairs; each can only be saved once
+    pairs = random.sample([(p["id"], m) for p in products for m in material_ids], min(20, len(products) * len(material_ids)))
+    
+    rows = [
+        {
+            "user_id": user.id,
+            "product_id": product_id,
+            "material_id": material_id,
+            "recommendation_score": random.uniform(0.7, 0.99),
+            "co2_reduction_percent": random.uniform(10, 80),
+            "cost_savings_percent": random.uniform(5, 40),
+            # random date in last 6 months
+            "created_at": base_date + timedelta(days=random.randint(0, 180))
+        }
+        for product_id, material_id in pairs
+    ]
+    db.session.bulk_insert_mappings(Recommendation, rows)
     db.session.commit()
-    print("✅ Successfully seeded 20 recommendations!")
+    print(f"✅ Successfully seeded {len(rows)} recommendations!")
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+# Self-contained: run against a throwaway SQLite database, not the configured one
+db_path = os.path.join(tempfile.mkdtemp(), "test_auth.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+from werkzeug.security import generate_password_hash
+from app import create_app
+from database import db
+from models import User
+import auth
+
+app = create_app()
+
+# Count real password checks to see what the login cache absorbs
+argon2_calls = []
+argon2_matches = auth.argon2_matches
+
+
+def counting_argon2_matches(stored, password):
+    argon2_calls.append(1)
+    return argon2_matches(stored, password)
+
+
+auth.argon2_matches = counting_argon2_matches
+
+with app.test_client() as client:
+    print("Testing register...")
+    resp = client.post('/api/auth/register', json={
+        "username": "auth_user", "email": "auth@example.com", "password": "secret123"
+    })
+    print(f"  Status: {resp.status_code}")
+    assert resp.status_code == 201, resp.text
+
+    # Duplicates are caught by the unique indexes, not pre-insert lookups
+    resp = client.post('/api/auth/register', json={
+        "username": "auth_user", "email": "other@example.com", "password": "secret123"
+    })
+    assert resp.status_code == 400 and resp.json["error"] == "Username already exists", resp.json
+    resp = client.post('/api/auth/register', json={
+        "username": "other_user", "email": "auth@example.com", "password": "secret123"
+    })
+    assert resp.status_code == 400 and resp.json["error"] == "Email already exists", resp.json
+
+    for password in ["short1", "lettersonly", "12345678", "has space 1"]:
+        resp = client.post('/api/auth/register', json={
+            "username": "weak_user", "email": "weak@example.com", "password": password
+        })
+        assert resp.status_code == 400, password
+
+    with app.app_context():
+        assert User.query.filter_by(username="auth_user").one().password_hash.startswith("$argon2id$")
+
+    print("Testing login and verify cache...")
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "secret123"})
+    assert resp.status_code == 200, resp.text
+    token = resp.json["access_token"]
+    calls = len(argon2_calls)
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "secret123"})
+    assert resp.status_code == 200 and len(argon2_calls) == calls, "repeat login should hit the cache"
+
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "wrong1234"})
+    assert resp.status_code == 401
+    calls = len(argon2_calls)
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "wrong1234"})
+    assert resp.status_code == 401 and len(argon2_calls) == calls
+
+    print("Testing legacy hash upgrade...")
+    with app.app_context():
+        user = User.query.filter_by(username="auth_user").one()
+        user.password_hash = generate_password_hash("newpass123")
+        db.session.commit()
+    # A changed stored hash must not be answered from the cache
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "secret123"})
+    assert resp.status_code == 401
+    resp = client.post('/api/auth/login', json={"username": "auth_user", "password": "newpass123"})
+    assert resp.status_code == 200, resp.text
+    with app.app_context():
+        assert User.query.filter_by(username="auth_user").one().password_hash.startswith("$argon2id$")
+
+    print("Testing profile and logout...")
+    headers = {'Authorization': f'Bearer {token}'}
+    for _ in range(2):  # Second call is served by the verified-token cache
+        resp = client.get('/api/auth/profile', headers=headers)
+        assert resp.status_code == 200 and resp.json["username"] == "auth_user", resp.text
+    assert client.get('/api/auth/profile').status_code == 401
+    assert client.get('/api/auth/profile', headers={'Authorization': 'Bearer nope'}).status_code == 401
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+
+print("✅ Auth tests passed")
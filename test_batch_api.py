@@ -0,0 +1,66 @@
+import os
+import tempfile
+
+# Self-contained: run against a throwaway SQLite database, not the configured one
+db_path = os.path.join(tempfile.mkdtemp(), "test_batch.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+from app import create_app
+from recommendations import BATCH_MAX_PRODUCTS
+
+app = create_app()
+
+with app.test_client() as client:
+    client.post('/api/auth/register', json={
+        "username": "batch_user", "email": "batch@example.com", "password": "secret123"
+    })
+    resp = client.post('/api/auth/login', json={"username": "batch_user", "password": "secret123"})
+    headers = {'Authorization': f'Bearer {resp.json["access_token"]}'}
+
+    # Every weight bucket: fragility sturdy/normal/fragile x temperature sensitivity
+    products = [
+        {
+            "product_name": f"Product {fragility}{'T' if temp else ''}",
+            "food_type": "Dry",
+            "weight_kg": 1.5,
+            "fragility_level": fragility,
+            "temperature_sensitive": temp
+        }
+        for fragility in range(1, 11)
+        for temp in (False, True)
+    ]
+
+    print("Testing batch recommend...")
+    resp = client.post('/api/recommendations/recommend/batch', headers=headers, json={"products": products})
+    print(f"  Status: {resp.status_code}")
+    assert resp.status_code == 200, resp.text
+    results = resp.json["results"]
+    assert len(results) == len(products)
+
+    print("Comparing with single /recommend...")
+    for product, result in zip(products, results):
+        single = client.post('/api/recommendations/recommend', headers=headers, json=product)
+        assert single.status_code == 200, single.text
+        assert result["product_name"] == product["product_name"]
+        assert result["recommendations"][0] == single.json["recommendations"][0], product
+        assert result["recommendations"] == single.json["recommendations"], product
+    print(f"  {len(products)} products match")
+
+    history = client.get('/api/recommendations/history', headers=headers)
+    # One saved top recommendation per batch product plus one per single call
+    assert history.json["total"] == 2 * len(products), history.json["total"]
+
+    print("Testing batch validation...")
+    too_many = {"products": [products[0]] * (BATCH_MAX_PRODUCTS + 1)}
+    missing = {"products": [products[0], {"product_name": "No fields"}]}
+    bad_number = {"products": [dict(products[0], weight_kg="heavy")]}
+    for name, payload in [("empty", {"products": []}), ("not a list", {"products": "x"}),
+                          ("too many", too_many), ("missing field", missing), ("bad number", bad_number)]:
+        resp = client.post('/api/recommendations/recommend/batch', headers=headers, json=payload)
+        print(f"  {name}: {resp.status_code} {resp.json['error']}")
+        assert resp.status_code == 400
+
+    resp = client.post('/api/recommendations/recommend/batch', json={"products": products})
+    assert resp.status_code == 401
+
+print("✅ Batch recommend tests passed")
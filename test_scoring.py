@@ -0,0 +1,64 @@
+import random
+from types import SimpleNamespace
+
+from recommendations import (
+    WEIGHTS, MaterialMatrix, calculate_material_score, calculate_impact_metrics,
+    py_round, top_k_indices, top_recommendations
+)
+import numpy as np
+
+# py_round must equal built-in round() everywhere, above all at halfway values
+grid = np.arange(0, 100001) / 1000.0
+assert py_round(grid, 2).tolist() == [round(v, 2) for v in grid.tolist()]
+positions = np.array([random.uniform(0, 100) for _ in range(100000)])
+assert py_round(positions, 2).tolist() == [round(v, 2) for v in positions.tolist()]
+
+# Vectorized scoring (/recommend, /recommend/batch) must agree exactly with the
+# scalar functions /save uses, including at halfway rounding values
+random.seed(0)
+weight_rows = list(WEIGHTS.values())
+mismatches = 0
+order_mismatches = 0
+
+for trial in range(3000):
+    materials = [
+        SimpleNamespace(
+            id=i + 1,
+            material_name=f"Material {i + 1}",
+            weight_capacity_kg=10.0,
+            biodegradability_score=random.randint(1, 10),
+            recyclability_percent=round(random.uniform(0, 100), random.choice([0, 1, 2])),
+            strength_rating=random.randint(1, 10),
+            co2_emission_score=round(random.uniform(0, 6), random.choice([1, 2, 3])),
+            cost_per_kg=round(random.uniform(0, 6), random.choice([1, 2, 3]))
+        )
+        for i in range(random.randint(1, 40))
+    ]
+    matrix = MaterialMatrix(materials)
+    co2_reduction, cost_savings = matrix.impact_metrics()
+    batch_scores = matrix.score_matrix(weight_rows)
+
+    for row, weights in enumerate(weight_rows):
+        scores = matrix.scores(weights)
+        scalar = [calculate_material_score(m, weights) for m in materials]
+        if scores.tolist() != scalar or batch_scores[row].tolist() != scalar:
+            mismatches += 1
+
+        # /recommend ranks the 0-10 scores and normalizes only the returned
+        # top 10; that must equal a stable sort of the scores /save would store
+        normalized = [round(s / 10, 3) for s in scalar]
+        expected = sorted(range(len(materials)), key=lambda i: -normalized[i])[:10]
+        top = top_recommendations(matrix, scores, co2_reduction, cost_savings)
+        if top_k_indices(scores, 10).tolist() != expected:
+            order_mismatches += 1
+        if [r["score"] for r in top] != [normalized[i] for i in expected]:
+            mismatches += 1
+
+    impact = [calculate_impact_metrics(m) for m in materials]
+    if list(zip(co2_reduction.tolist(), cost_savings.tolist())) != impact:
+        mismatches += 1
+
+print(f"Score mismatches: {mismatches}")
+print(f"Top-10 order mismatches: {order_mismatches}")
+assert mismatches == 0 and order_mismatches == 0
+print("✅ Vectorized and scalar scoring agree")